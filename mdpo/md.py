@@ -1,5 +1,6 @@
 """Markdown related utilities for mdpo."""
 
+import functools
 import re
 
 import md4c
@@ -9,9 +10,48 @@ from mdpo.text import min_not_max_chars_in_a_row
 
 
 LINK_REFERENCE_RE = re.compile(
-    r'^\s{0,3}\[([^\]]+)\]:\s+<?([^\s>]+)>?\s*["\'\(]?([^"\'\)]+)?',
+    r'^\s{0,3}\[([^\[\]]+)\]:\s+<?([^\s>]+)>?\s*["\'\(]?([^"\'\)]+)?',
 )
-LINK_REFERENCED_LINK_RE = re.compile(r'\[([^\]]+)\]\[([^\]\s]+)\]')
+
+# same as above, but finds all link reference definitions of a Markdown
+# content in a single scan, without crossing lines; any indentation is
+# allowed because definitions can be nested inside list items. Lines can
+# end with '\n', '\r\n' or '\r', so '^' with re.MULTILINE is not used
+LINK_REFERENCE_MULTILINE_RE = re.compile(
+    r'(?:\A|(?<=[\r\n]))[^\S\r\n]*\[([^\[\]\r\n]+)\]:[ \t]+<?([^\s>]+)>?'
+    r'[ \t]*["\'\(]?([^"\'\)\r\n]+)?',
+)
+
+# brackets are excluded from the groups so failed searches starting at each
+# '[' character don't rescan the rest of the string (quadratic backtracking)
+LINK_REFERENCED_LINK_RE = re.compile(
+    r'\[([^\[\]]+)\]\[([^\[\]\s]+)\]',
+)
+
+
+# default delimiters regex, same as built by ``_links_titles_regex('[', ']')``
+_DEFAULT_LINK_TITLES_RE = re.compile(r'(\[[^\[\]]+\]\([^\s]+\s)([^\)]+)')
+
+
+@functools.lru_cache(maxsize=32)
+def _links_titles_regex(link_start_string, link_end_string):
+    link_start_string_escaped_regex = re.escape(link_start_string)
+    link_end_string_escaped_regex = re.escape(link_end_string)
+    return re.compile(
+        r'({}[^{}{}]+{}\([^\s]+\s)([^\)]+)'.format(
+            link_start_string_escaped_regex,
+            link_start_string_escaped_regex,
+            link_end_string_escaped_regex,
+            link_end_string_escaped_regex,
+        ),
+    )
+
+
+def _escape_link_title_match(match):
+    return '{}"{}"'.format(
+        match.group(1),
+        match.group(2)[1:-1].replace('"', '\\"'),
+    )
 
 
 def escape_links_titles(text, link_start_string='[', link_end_string=']'):
@@ -35,22 +75,11 @@ def escape_links_titles(text, link_start_string='[', link_end_string=']'):
         >>> escape_links_titles(title)
         '[a link](href "title with characters to escape \\"")'
     """
-    link_end_string_escaped_regex = re.escape(link_end_string)
-    regex = re.compile(
-        r'({}[^{}]+{}\([^\s]+\s)([^\)]+)'.format(
-            re.escape(link_start_string),
-            link_end_string_escaped_regex,
-            link_end_string_escaped_regex,
-        ),
-    )
-
-    for match in re.findall(regex, text):
-        original_string = match[0] + match[1]
-        target_string = match[0] + '"%s"' % (
-            match[1][1:-1].replace('"', '\\"')
-        )
-        text = text.replace(original_string, target_string)
-    return text
+    if link_start_string == '[' and link_end_string == ']':
+        regex = _DEFAULT_LINK_TITLES_RE
+    else:
+        regex = _links_titles_regex(link_start_string, link_end_string)
+    return regex.sub(_escape_link_title_match, text)
 
 
 def parse_link_references(content):
@@ -63,25 +92,32 @@ def parse_link_references(content):
         list: Tuples with 3 values, target, href and title for each link
             reference.
     """
-    response = []
-    for line in content.splitlines():
-        linestrip = line.strip()
-        if linestrip and linestrip[0] == '[':
-            match = re.search(LINK_REFERENCE_RE, linestrip)
-            if match:
-                response.append(match.groups())
-    return response
+    return [
+        match.groups()
+        for match in LINK_REFERENCE_MULTILINE_RE.finditer(content)
+    ]
 
 
-class MarkdownSpanWrapper:
-    __slots__ = {
-        # arguments
-        'width',
-        'first_line_width',
-        'indent',
-        'first_line_indent',
-        'md4c_extensions',
+@functools.lru_cache(maxsize=8)
+def _md4c_generic_parser(extensions):
+    # md4c parsers don't store state between `parse` calls, so they can be
+    # reused by all the wrappers which use the same extensions
+    return md4c.GenericParser(0, **{ext: True for ext in extensions})
+
+
+class MarkdownSpanWrapperConfig:
+    """Markup strings used by :py:class:`MarkdownSpanWrapper` instances.
+
+    Computed once, so the same configuration can be shared by all the
+    wrappers created while translating a document. Wrappers created with a
+    configuration don't accept markup strings as keyword arguments.
 
+    Args:
+        **kwargs: Markup strings, like ``bold_start_string`` or
+            ``code_start_string_escaped``, that override the default ones.
+    """
+
+    __slots__ = (
         'bold_start_string',
         'bold_end_string',
         'italic_start_string',
@@ -96,34 +132,9 @@ class MarkdownSpanWrapper:
         'link_end_string',
         'wikilink_start_string',
         'wikilink_end_string',
+    )
 
-        # state
-        'output',
-        '_current_line',
-        '_current_aspan_href',
-        '_current_aspan_title',
-        '_inside_codespan',
-        '_current_wikilink_target',
-    }
-
-    def __init__(
-        self,
-        width=80,
-        first_line_width=80,
-        indent='',
-        first_line_indent='',
-        md4c_extensions={},
-        **kwargs,
-    ):
-        self.width = width
-        self.first_line_width = first_line_width
-        self.indent = indent
-        self.first_line_indent = first_line_indent
-        self.md4c_extensions = md4c_extensions
-
-        self.output = ''
-        self._current_line = ''
-
+    def __init__(self, **kwargs):
         self.bold_start_string = kwargs.get('bold_start_string', '**')
         self.bold_end_string = kwargs.get('bold_end_string', '**')
         self.italic_start_string = kwargs.get('italic_start_string', '*')
@@ -152,16 +163,97 @@ class MarkdownSpanWrapper:
             po_escaped_string(self.code_end_string),
         )
 
+
+class MarkdownSpanWrapper:
+    __slots__ = (
+        # arguments
+        'width',
+        'first_line_width',
+        'indent',
+        'first_line_indent',
+        'md4c_extensions',
+
+        'config',
+
+        # state
+        '_output',
+        '_current_line_parts',
+        '_current_line_len',
+        '_current_aspan_href',
+        '_current_aspan_title',
+        '_inside_codespan',
+        '_current_wikilink_target',
+    )
+
+    def __init__(
+        self,
+        width=80,
+        first_line_width=80,
+        indent='',
+        first_line_indent='',
+        md4c_extensions={},
+        config=None,
+        **kwargs,
+    ):
+        self.width = width
+        self.first_line_width = first_line_width
+        self.indent = indent
+        self.first_line_indent = first_line_indent
+        self.md4c_extensions = md4c_extensions
+
+        if config is None:
+            config = MarkdownSpanWrapperConfig(**kwargs)
+        elif kwargs:
+            raise TypeError(
+                'Markup strings can not be passed to MarkdownSpanWrapper'
+                ' along with a configuration, define them in the'
+                ' configuration instead',
+            )
+        self.config = config
+
+        self.reset()
+
+    def reset(self):
+        """Resets the wrapping state.
+
+        Called by :py:meth:`MarkdownSpanWrapper.wrap` before wrapping, so
+        the same wrapper can be reused for multiple texts.
+        """
+        self._output = []
+        self._current_line_parts = []
+        self._current_line_len = 0
+
         self._current_aspan_href = None
         self._current_aspan_title = None
         self._inside_codespan = False
         self._current_wikilink_target = None
 
     def _get_currently_applied_width(self):
-        return self.width if self.output else self.first_line_width
+        return self.width if self._output else self.first_line_width
 
     def _get_currently_applied_indent(self):
-        return self.indent if self.output else self.first_line_indent
+        return self.indent if self._output else self.first_line_indent
+
+    def _append(self, string):
+        if string:
+            self._current_line_parts.append(string)
+            self._current_line_len += len(string)
+
+    def _get_current_line(self):
+        return ''.join(self._current_line_parts)
+
+    def _set_current_line(self, string):
+        self._current_line_parts = [string] if string else []
+        self._current_line_len = len(string)
+
+    def _current_line_endswith(self, char):
+        return (
+            bool(self._current_line_parts)
+            and self._current_line_parts[-1][-1] == char
+        )
+
+    def _save_current_line(self, line):
+        self._output.append(f'{self._get_currently_applied_indent()}{line}\n')
 
     def enter_block(self, block, details):
         pass
@@ -169,81 +261,118 @@ class MarkdownSpanWrapper:
     def leave_block(self, block, details):
         pass
 
+    def _enter_code_span(self, details):
+        self._inside_codespan = True
+        self._append(self.config.code_start_string)
+
+    def _enter_a_span(self, details):
+        self._append(self.config.link_start_string)
+        self._current_aspan_href = details['href'][0][1]
+        self._current_aspan_title = (
+            details['title'][0][1] if details['title'] else None
+        )
+
+    def _enter_strong_span(self, details):
+        self._append(self.config.bold_start_string)
+
+    def _enter_em_span(self, details):
+        self._append(self.config.italic_start_string)
+
+    def _enter_wikilink_span(self, details):
+        self._append(self.config.wikilink_start_string)
+        self._current_wikilink_target = details['target'][0][1]
+
+    def _enter_img_span(self, details):
+        self._append('![')
+
+    def _leave_code_span(self, details):
+        self._inside_codespan = False
+        self._append(self.config.code_end_string)
+
+    def _leave_a_span(self, details):
+        if not self._current_line_endswith('>'):
+            self._append(f']({self._current_aspan_href}')
+            if self._current_aspan_title:
+                self._append(
+                    f' "{escape_links_titles(self._current_aspan_title)}"',
+                )
+            self._append(')')
+        self._current_aspan_href, self._current_aspan_title = None, None
+
+    def _leave_strong_span(self, details):
+        self._append(self.config.bold_end_string)
+
+    def _leave_em_span(self, details):
+        self._append(self.config.italic_end_string)
+
+    def _leave_wikilink_span(self, details):
+        self._append(self.config.wikilink_end_string)
+        self._current_wikilink_target = None
+
+    def _leave_img_span(self, details):
+        src = details['src'][0][1]
+        self._append(f']({src}')
+        if details['title']:
+            title = details['title'][0][1]
+            self._append(f' "{escape_links_titles(title)}"')
+        self._append(')')
+
+    # span handlers indexed by span type, other spans (like underlines or
+    # strikethroughs) are ignored
+    _ENTER_SPAN_HANDLERS = {
+        md4c.SpanType.CODE: _enter_code_span,
+        md4c.SpanType.A: _enter_a_span,
+        md4c.SpanType.STRONG: _enter_strong_span,
+        md4c.SpanType.EM: _enter_em_span,
+        md4c.SpanType.WIKILINK: _enter_wikilink_span,
+        md4c.SpanType.IMG: _enter_img_span,
+    }
+
+    _LEAVE_SPAN_HANDLERS = {
+        md4c.SpanType.CODE: _leave_code_span,
+        md4c.SpanType.A: _leave_a_span,
+        md4c.SpanType.STRONG: _leave_strong_span,
+        md4c.SpanType.EM: _leave_em_span,
+        md4c.SpanType.WIKILINK: _leave_wikilink_span,
+        md4c.SpanType.IMG: _leave_img_span,
+    }
+
     def enter_span(self, span, details):
-        if span is md4c.SpanType.CODE:
-            self._inside_codespan = True
-            self._current_line += self.code_start_string
-        elif span is md4c.SpanType.A:
-            self._current_line += self.link_start_string
-            self._current_aspan_href = details['href'][0][1]
-            self._current_aspan_title = (
-                details['title'][0][1] if details['title'] else None
-            )
-        elif span is md4c.SpanType.STRONG:
-            self._current_line += self.bold_start_string
-        elif span is md4c.SpanType.EM:
-            self._current_line += self.italic_start_string
-        elif span is md4c.SpanType.WIKILINK:
-            self._current_line += self.wikilink_start_string
-            self._current_wikilink_target = details['target'][0][1]
-        elif span is md4c.SpanType.IMG:
-            self._current_line += '!['
+        handler = self._ENTER_SPAN_HANDLERS.get(span)
+        if handler is not None:
+            handler(self, details)
 
     def leave_span(self, span, details):
-        if span is md4c.SpanType.CODE:
-            self._inside_codespan = False
-            self._current_line += self.code_end_string
-        elif span is md4c.SpanType.A:
-            if self._current_line[-1] != '>':
-                self._current_line += f']({self._current_aspan_href}'
-                if self._current_aspan_title:
-                    self._current_line += (
-                        f' "{escape_links_titles(self._current_aspan_title)}"'
-                    )
-                self._current_line += ')'
-            self._current_aspan_href = False
-            self._current_aspan_href = None
-            self._current_aspan_title = None
-        elif span is md4c.SpanType.STRONG:
-            self._current_line += self.bold_end_string
-        elif span is md4c.SpanType.EM:
-            self._current_line += self.italic_end_string
-        elif span is md4c.SpanType.WIKILINK:
-            self._current_line += self.wikilink_end_string
-            self._current_wikilink_target = None
-        elif span is md4c.SpanType.IMG:
-            src = details['src'][0][1]
-            self._current_line += f']({src}'
-            if details['title']:
-                title = details['title'][0][1]
-                self._current_line += f' "{escape_links_titles(title)}"'
-            self._current_line += ')'
+        handler = self._LEAVE_SPAN_HANDLERS.get(span)
+        if handler is not None:
+            handler(self, details)
 
     def text(self, block, text):
         if self._inside_codespan:
             width = self._get_currently_applied_width()
-            indent = self._get_currently_applied_indent()
 
-            if len(self._current_line) + len(text) + 1 > width:
-                self._current_line = self._current_line.rstrip('`').rstrip(' ')
-                self.output += f'{indent}{self._current_line}\n'
-                self._current_line = '`'
+            if self._current_line_len + len(text) + 1 > width:
+                # not ``rstrip(' `')``, which would also remove the closing
+                # backtick of a previous codespan separated by a space
+                self._save_current_line(
+                    self._get_current_line().rstrip('`').rstrip(' '),
+                )
+                self._set_current_line('`')
 
+            # `code_start_string` is already a single character
             n_backticks = min_not_max_chars_in_a_row(
-                self.code_start_string[0],
+                self.config.code_start_string,
                 text,
             ) - 1
             if n_backticks:
-                self._current_line += n_backticks * '`'
+                self._append(n_backticks * '`')
 
-            self._current_line += f'{text}{n_backticks * "`"}'
+            self._append(f'{text}{n_backticks * "`"}')
         elif self._current_wikilink_target:
             if text != self._current_wikilink_target:
-                self._current_line += (
-                    f'{self._current_wikilink_target}|{text}'
-                )
+                self._append(f'{self._current_wikilink_target}|{text}')
             else:
-                self._current_line += text
+                self._append(text)
             return
         else:
             if self._current_aspan_href:
@@ -251,53 +380,57 @@ class MarkdownSpanWrapper:
                     self._current_aspan_href == text
                     and not self._current_aspan_title
                 ):
-                    self._current_line = (
-                        f"{self._current_line.rstrip(' [')} <{text}>"
+                    self._set_current_line(
+                        f"{self._get_current_line().rstrip(' [')} <{text}>",
                     )
                     return
 
-            if text == self.italic_start_string:
-                text = self.italic_start_string_escaped
-            elif text == self.code_start_string:
-                text = self.code_start_string_escaped
-            elif text == self.code_end_string:  # pragma: no cover
-                text = self.code_end_string_escaped
-            elif text == self.italic_end_string:  # pragma: no cover
-                text = self.italic_end_string_escaped
+            config = self.config
+            if text == config.italic_start_string:
+                text = config.italic_start_string_escaped
+            elif text == config.code_start_string:
+                text = config.code_start_string_escaped
+            elif text == config.code_end_string:  # pragma: no cover
+                text = config.code_end_string_escaped
+            elif text == config.italic_end_string:  # pragma: no cover
+                text = config.italic_end_string_escaped
 
             text_splits = text.split(' ')
             width = self._get_currently_applied_width()
+            # width applied after breaking a line, which is never the first
+            next_lines_width = self.width
             if self._current_aspan_href:  # links wrapping
-                if len(self._current_line) + len(text_splits[0]) + 1 > width:
-                    indent = self._get_currently_applied_indent()
+                if self._current_line_len + len(text_splits[0]) + 1 > width:
                     # new link text in newline
-                    self._current_line = self._current_line[:-1].rstrip(' ')
-                    self.output += f'{indent}{self._current_line}\n'
-                    self._current_line = '['
+                    self._save_current_line(
+                        self._get_current_line()[:-1].rstrip(' '),
+                    )
+                    self._set_current_line('[')
                 width *= .95        # latest word in newline
+                next_lines_width *= .95
 
+            append = self._append
             for i, text_split in enumerate(text_splits):
                 # +1 is a space here
-                if len(self._current_line) + len(text_split) + 1 > width:
-                    if i or (
-                        self._current_line and self._current_line[-1] == ' '
-                    ):
-                        indent = self._get_currently_applied_indent()
-                        self.output += f'{indent}{self._current_line}\n'
-                        self._current_line = ''
-                        width = self._get_currently_applied_width()
-                        if self._current_aspan_href:
-                            width *= .95
+                if self._current_line_len + len(text_split) + 1 > width:
+                    if i or self._current_line_endswith(' '):
+                        self._save_current_line(self._get_current_line())
+                        self._set_current_line('')
+                        width = next_lines_width
                 elif i:
-                    self._current_line += ' '
-                self._current_line += text_split
+                    append(' ')
+                append(text_split)
+
+    @property
+    def output(self):
+        """Text wrapped by the latest :py:meth:`MarkdownSpanWrapper.wrap`."""
+        return ''.join(self._output)
 
     def wrap(self, text):
         """Wraps reasonably Markdown lines."""
-        parser = md4c.GenericParser(
-            0,
-            **{ext: True for ext in self.md4c_extensions},
-        )
+        self.reset()
+
+        parser = _md4c_generic_parser(frozenset(self.md4c_extensions))
         parser.parse(
             text,
             self.enter_block,
@@ -307,15 +440,28 @@ class MarkdownSpanWrapper:
             self.text,
         )
 
-        if self._current_line:
-            self.output += (
-                f'{self._get_currently_applied_indent()}{self._current_line}'
+        if self._current_line_parts:
+            self._output.append(
+                self._get_currently_applied_indent()
+                + self._get_current_line(),
             )
         if self.first_line_width == self.width:  # is not blockquote nor list
-            self.output += '\n'
+            self._output.append('\n')
         return self.output
 
 
+def _solve_referenced_links(text, targets):
+    def replace_referenced_link(match):
+        target = targets.get(match.group(2))
+        if target is None:
+            return match.group(0)
+        return f'[{match.group(1)}]({target})'
+
+    solved_text = LINK_REFERENCED_LINK_RE.sub(replace_referenced_link, text)
+    # ``None`` if none of the referenced links has been solved
+    return solved_text if solved_text != text else None
+
+
 def solve_link_reference_targets(translations):
     """Solve link reference targets in markdown blocks.
 
@@ -334,94 +480,46 @@ def solve_link_reference_targets(translations):
     # dictionary with defined link references and their targets
     link_references_text_targets = []
 
-    # compound by dictionaries with `original_msgid`, `original_msgstr` and
-    # `link_reference_matchs`
+    # compound by tuples with original msgid and msgstr that contain
+    # referenced links
     msgid_msgstrs_with_links = []
 
-    # discover link reference definitions
+    # discover link reference definitions and messages with referenced
+    # links in a single pass
+    #
+    # substring checks are used as filters for performance improvement,
+    # most of the messages don't contain link references at all, and at
+    # most one kind of regex is executed against each msgid
+    match_link_reference = LINK_REFERENCE_RE.match
+    search_referenced_link = LINK_REFERENCED_LINK_RE.search
     for msgid, msgstr in translations.items():
-        if msgid[0] == '[':  # filter for performance improvement
-            msgid_match = re.search(LINK_REFERENCE_RE, msgid)
+        if msgid.startswith('[') and ']:' in msgid:
+            msgid_match = match_link_reference(msgid)
             if msgid_match:
-                msgstr_match = re.search(LINK_REFERENCE_RE, msgstr)
+                msgstr_match = match_link_reference(msgstr)
                 if msgstr_match:
                     link_references_text_targets.append((
                         msgid_match.groups(),
                         msgstr_match.groups(),
                     ))
-        msgid_matchs = re.findall(LINK_REFERENCED_LINK_RE, msgid)
-        if msgid_matchs:
-            msgstr_matchs = re.findall(LINK_REFERENCED_LINK_RE, msgstr)
-            if msgstr_matchs:
-                msgid_msgstrs_with_links.append((
-                    msgid, msgstr, msgid_matchs, msgstr_matchs,
-                ))
-
-    # original msgid, original msgstr,
-    # msgid link reference matchs, msgstr link reference matchs
-    for (
-            orig_msgid, orig_msgstr, msgid_linkr_groups, msgstr_linkr_groups,
-    ) in msgid_msgstrs_with_links:
-        # search if msgid and link reference matchs are inside
-        # `link_references_text_targets`
-        #
-        # if so, replace in original messages link referenced targets with
-        # real targets and store them in solutions
-        new_msgid, new_msgstr = (None, None)
-
-        for msgid_linkr_group in msgid_linkr_groups:
-            for link_reference_text_targets in link_references_text_targets:
-
-                # link_reference_text_targets[msgid][link_reference]
-                if link_reference_text_targets[0][0] == msgid_linkr_group[1]:
-                    replacer = (
-                        f'[{msgid_linkr_group[0]}][{msgid_linkr_group[1]}]'
-                    )
-                    replacement = (
-                        # link_reference_text_targets[msgid][target]
-                        f'[{msgid_linkr_group[0]}]'
-                        f'({link_reference_text_targets[0][1]})'
-                    )
-
-                    if new_msgid is None:
-                        # first referenced link replacement in msgid
-                        new_msgid = orig_msgid.replace(replacer, replacement)
-                    else:
-                        # consecutive referenced link replacements in msgid
-                        new_msgid = new_msgid.replace(replacer, replacement)
-                    break
-
-        # the same game as above, but now for msgstrs
-
-        for msgstr_linkr_group in msgstr_linkr_groups:
-            for link_reference_text_targets in link_references_text_targets:
-
-                # link_reference_text_targets[msgstr][link_reference]
-                if link_reference_text_targets[1][0] == msgstr_linkr_group[1]:
-                    replacer = (
-                        f'[{msgstr_linkr_group[0]}][{msgstr_linkr_group[1]}]'
-                    )
-                    replacement = (
-                        # link_reference_text_targets[msgstr][target]
-                        f'[{msgstr_linkr_group[0]}]'
-                        f'({link_reference_text_targets[1][1]})'
-                    )
-
-                    if new_msgstr is None:
-                        # first referenced link replacement in msgid
-                        new_msgstr = orig_msgstr.replace(replacer, replacement)
-                    else:
-                        # consecutive referenced link replacements in msgid
-                        new_msgstr = new_msgstr.replace(replacer, replacement)
-                    break
-
-        # store in solutions
-        solutions[new_msgid] = new_msgstr
-
-        # print("----> new_msgid", new_msgid)
-        # print("----> new_msgstr", new_msgstr)
-
-    # print("----> link_references_text_targets", link_references_text_targets)
-    # print("----> msgid_msgstrs_with_links", msgid_msgstrs_with_links)
-    # print("----> solutions", solutions)
+                continue
+        if (
+            '][' in msgid
+            and search_referenced_link(msgid)
+            and search_referenced_link(msgstr)
+        ):
+            msgid_msgstrs_with_links.append((msgid, msgstr))
+
+    # index link reference targets by label, the first definition wins
+    msgid_targets, msgstr_targets = ({}, {})
+    for msgid_group, msgstr_group in link_references_text_targets:
+        msgid_targets.setdefault(msgid_group[0], msgid_group[1])
+        msgstr_targets.setdefault(msgstr_group[0], msgstr_group[1])
+
+    # replace in original messages link referenced targets with real targets
+    # and store them in solutions
+    for orig_msgid, orig_msgstr in msgid_msgstrs_with_links:
+        solutions[_solve_referenced_links(orig_msgid, msgid_targets)] = (
+            _solve_referenced_links(orig_msgstr, msgstr_targets)
+        )
     return solutions
@@ -14,6 +14,7 @@ from mdpo.event import debug_events, raise_skip_event
 from mdpo.io import save_file_checking_file_changed, to_file_content_if_is_file
 from mdpo.md import (
     MarkdownSpanWrapper,
+    MarkdownSpanWrapperConfig,
     escape_links_titles,
     parse_link_references,
 )
@@ -72,6 +73,7 @@ class Po2Md:
         '_enable_next_line',
         '_enterspan_replacer',
         '_leavespan_replacer',
+        '_span_wrapper',
         '_saved_files_changed',
 
         # state
@@ -217,6 +219,21 @@ class Po2Md:
             self._leavespan_replacer[md4c.SpanType.WIKILINK.value] = \
                 self.wikilink_end_string
 
+        # reused to wrap all the translations
+        self._span_wrapper = MarkdownSpanWrapper(
+            md4c_extensions=self.extensions,
+            config=MarkdownSpanWrapperConfig(
+                code_start_string=self.code_start_string,
+                code_end_string=self.code_end_string,
+                italic_start_string_escaped=self.italic_start_string_escaped,
+                italic_end_string_escaped=self.italic_end_string_escaped,
+                code_start_string_escaped=self.code_start_string_escaped,
+                code_end_string_escaped=self.code_end_string_escaped,
+                wikilink_start_string=self.wikilink_start_string,
+                wikilink_end_string=self.wikilink_end_string,
+            ),
+        )
+
         self._inside_htmlblock = False
         self._inside_codeblock = False
         self._inside_indented_codeblock = False
@@ -380,22 +397,15 @@ class Po2Md:
                 if len(self._current_list_type) > 1:
                     indent = '   ' * len(self._current_list_type)
 
-                translation = MarkdownSpanWrapper(
-                    width=self.wrapwidth,
-                    first_line_width=self.wrapwidth + first_line_width_diff,
-                    indent=indent,
-                    md4c_extensions=self.extensions,
-                    code_start_string=self.code_start_string,
-                    code_end_string=self.code_end_string,
-                    italic_start_string_escaped=(
-                        self.italic_start_string_escaped
-                    ),
-                    italic_end_string_escaped=self.italic_end_string_escaped,
-                    code_start_string_escaped=self.code_start_string_escaped,
-                    code_end_string_escaped=self.code_end_string_escaped,
-                    wikilink_start_string=self.wikilink_start_string,
-                    wikilink_end_string=self.wikilink_end_string,
-                ).wrap(self._escape_translation(translation))
+                span_wrapper = self._span_wrapper
+                span_wrapper.width = self.wrapwidth
+                span_wrapper.first_line_width = (
+                    self.wrapwidth + first_line_width_diff
+                )
+                span_wrapper.indent = indent
+                translation = span_wrapper.wrap(
+                    self._escape_translation(translation),
+                )
 
                 if self._inside_hblock or self._inside_table:
                     translation = translation.rstrip('\n')
@@ -0,0 +1,214 @@
+"""Tests for mdpo Markdown utilities."""
+
+import pytest
+
+from mdpo.md import (
+    LINK_REFERENCE_RE,
+    LINK_REFERENCED_LINK_RE,
+    MarkdownSpanWrapper,
+    MarkdownSpanWrapperConfig,
+    escape_links_titles,
+    parse_link_references,
+    solve_link_reference_targets,
+)
+
+
+@pytest.mark.parametrize(
+    ('text', 'link_start_string', 'link_end_string', 'expected_result'), (
+        (
+            '[a link](href "title with characters to escape "")',
+            '[',
+            ']',
+            '[a link](href "title with characters to escape \\"")',
+        ),
+        (
+            '[foo](href "a "b"") and [bar](href "a "b"")',
+            '[',
+            ']',
+            '[foo](href "a \\"b\\"") and [bar](href "a \\"b\\"")',
+        ),
+        (
+            '{a link}(href "title "")',
+            '{',
+            '}',
+            '{a link}(href "title \\"")',
+        ),
+        ('text without links', '[', ']', 'text without links'),
+    ),
+)
+def test_escape_links_titles(
+    text,
+    link_start_string,
+    link_end_string,
+    expected_result,
+):
+    assert escape_links_titles(
+        text,
+        link_start_string=link_start_string,
+        link_end_string=link_end_string,
+    ) == expected_result
+
+
+def test_parse_link_references():
+    content = (
+        'Some [link][foo] and [other][bar].\n'
+        '\n'
+        '[foo]: https://foo.com\n'
+        '   [bar]: <https://bar.com> "Bar title"\n'
+        '    [baz]: https://baz.com\n'
+    )
+    assert parse_link_references(content) == [
+        ('foo', 'https://foo.com', None),
+        ('bar', 'https://bar.com', 'Bar title'),
+        ('baz', 'https://baz.com', None),
+    ]
+
+
+@pytest.mark.parametrize(
+    ('content', 'expected_result'), (
+        pytest.param(
+            '- Item with [a link][foo].\n\n    [foo]: https://foo.com\n',
+            [('foo', 'https://foo.com', None)],
+            id='indented',
+        ),
+        pytest.param(
+            '\t[foo]: https://foo.com\n \t[bar]: https://bar.com "Bar"\n',
+            [
+                ('foo', 'https://foo.com', None),
+                ('bar', 'https://bar.com', 'Bar'),
+            ],
+            id='tab-prefixed',
+        ),
+        pytest.param(
+            '[foo]: https://foo.com\r\n[bar]: <https://bar.com> "Bar"\r\n',
+            [
+                ('foo', 'https://foo.com', None),
+                ('bar', 'https://bar.com', 'Bar'),
+            ],
+            id='crlf',
+        ),
+        pytest.param(
+            '[foo]: https://foo.com\r[bar]: <https://bar.com> "Bar"\r',
+            [
+                ('foo', 'https://foo.com', None),
+                ('bar', 'https://bar.com', 'Bar'),
+            ],
+            id='cr',
+        ),
+        pytest.param(
+            '[foo]: https://foo.com  \n[bar]: https://bar.com "Bar "\n',
+            [
+                ('foo', 'https://foo.com', None),
+                ('bar', 'https://bar.com', 'Bar '),
+            ],
+            id='title-trailing-space',
+        ),
+        pytest.param(
+            'A [link][foo].\n[foo]:\nhttps://foo.com\n',
+            [],
+            id='no-cross-lines',
+        ),
+    ),
+)
+def test_parse_link_references_whitespaces(content, expected_result):
+    assert parse_link_references(content) == expected_result
+
+
+def test_solve_link_reference_targets():
+    translations = {
+        '[foo]: https://foo.com': '[foo]: https://foo.es',
+        '[bar]: https://bar.com': '[bar]: https://bar.es',
+        # first definitions take precedence
+        '[foo]: https://other.com': '[foo]: https://other.es',
+        'A [link][foo] and [other][bar].': 'Un [enlace][foo] y [otro][bar].',
+        'Some text': 'Algo de texto',
+    }
+    assert solve_link_reference_targets(translations) == {
+        'A [link](https://foo.com) and [other](https://bar.com).': (
+            'Un [enlace](https://foo.es) y [otro](https://bar.es).'
+        ),
+    }
+
+
+def test_link_reference_re_anchored():
+    assert LINK_REFERENCE_RE.search('Text [foo]: https://foo.com') is None
+    assert LINK_REFERENCE_RE.search('   [foo]: https://foo.com').groups() == (
+        'foo', 'https://foo.com', None,
+    )
+
+
+def test_solve_link_reference_targets_indented_msgstr():
+    translations = {
+        '[foo]: https://foo.com': ' [foo]: https://foo.es',
+        'A [link][foo].': 'Un [enlace][foo].',
+    }
+    assert solve_link_reference_targets(translations) == {
+        'A [link](https://foo.com).': 'Un [enlace](https://foo.es).',
+    }
+
+
+def test_link_references_labels_without_brackets():
+    # an opening bracket inside the label is not part of it
+    assert parse_link_references('[a [b]: https://foo.com\n') == []
+    assert solve_link_reference_targets({
+        '[foo]: https://foo.com': '[foo]: https://foo.es',
+        'A [b[c][foo].': 'Un [b[c][foo].',
+    }) == {'A [b[c](https://foo.com).': 'Un [b[c](https://foo.es).'}
+
+
+def test_link_references_brackets_run():
+    # long runs of opening brackets must not cause quadratic backtracking
+    brackets = '[' * 20000
+
+    assert LINK_REFERENCED_LINK_RE.search(f'{brackets}][') is None
+    assert parse_link_references(f'{brackets}]: https://foo.com') == []
+    assert solve_link_reference_targets({
+        f'{brackets}][': f'{brackets}][',
+        f'{brackets}]: https://foo.com': f'{brackets}]: https://foo.es',
+    }) == {}
+
+
+@pytest.mark.parametrize(
+    ('text', 'expected_output'), (
+        (
+            'Some text with a `long code span` and `more code` that wraps.',
+            (
+                'Some text with\na\n`long code span`\nand\n`more code`\n'
+                'that wraps.\n'
+            ),
+        ),
+        (
+            'Text `a` `b` `c` `d` `e` `f` `g` `h`.',
+            'Text `a` `b`\n`c` `d` `e`\n`f` `g` `h`.\n',
+        ),
+        (
+            'Some ``code with ` backtick`` inside it',
+            'Some\n``code with ` backtick``\ninside it\n',
+        ),
+    ),
+)
+def test_markdown_span_wrapper_codespans_wrapping(text, expected_output):
+    wrapper = MarkdownSpanWrapper(width=14, first_line_width=14)
+    assert wrapper.wrap(text) == expected_output
+
+
+def test_markdown_span_wrapper_reuse():
+    config = MarkdownSpanWrapperConfig(code_start_string='`')
+    wrapper = MarkdownSpanWrapper(width=20, first_line_width=20, config=config)
+
+    text = 'Some **bold** and `code` text that will be wrapped.'
+    output = wrapper.wrap(text)
+    assert output == 'Some **bold** and\n`code` text that\nwill be wrapped.\n'
+    assert wrapper.output == output
+
+    # state is reset by each wrap
+    assert wrapper.wrap(text) == output
+    assert wrapper.wrap('Other text.') == 'Other text.\n'
+
+
+def test_markdown_span_wrapper_config_with_markup_strings():
+    with pytest.raises(TypeError):
+        MarkdownSpanWrapper(
+            config=MarkdownSpanWrapperConfig(),
+            bold_start_string='__',
+        )